@@ -1,12 +1,108 @@
+import os
+import asyncio
+import logging
 import requests
-from bs4 import BeautifulSoup
+import aiohttp
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from selectolax.lexbor import LexborHTMLParser
+import trafilatura
 import feedparser
 from typing import List, Dict, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
 
+logger = logging.getLogger(__name__)
+
 # Configuración (usa el mismo User-Agent definido en tu .env)
 USER_AGENT = os.getenv("USER_AGENT", "Mozilla/5.0 (Custom News Agent)")
+# Brotli (requiere el paquete 'brotli') reduce bastante los bytes transferidos frente a gzip
+ACCEPT_ENCODING = 'br, gzip'
+REQUEST_TIMEOUT = 15
+FEED_TIMEOUT = 10
+MAX_HTML_BYTES = 2_000_000 # Se descarta el resto de páginas enormes (trackers, anuncios...)
+HTML_CHUNK_BYTES = 64 * 1024
+# Reintentos ante saturación/errores transitorios del servidor (sesión requests y aiohttp)
+RETRY_STATUSES = (429, 502, 503, 504)
+MAX_RETRIES = 2
+RETRY_BACKOFF = 0.3
+MIN_EXTRACTED_CHARS = 250 # Por debajo, se recurre a los selectores de SOURCE_SELECTORS
+
+# Selector CSS del cuerpo del artículo para cada fuente (por defecto se usa <body>)
+SOURCE_SELECTORS: Dict[str, str] = {
+    "CincoDías": "div.article-body",
+    "ElEconomista": "div[itemprop='articleBody']",
+    "ABC": "div[data-voc-component='voc-d']",
+    "ElMundoFinanciero": "div.td-post-content",
+    "Bloomberg": "div[class*='body-content']",
+}
+
+# Sesión HTTP compartida: reutiliza las conexiones (keep-alive) entre artículos del mismo host
+_SESSION = requests.Session()
+_SESSION.headers.update({'User-Agent': USER_AGENT, 'Accept-Encoding': ACCEPT_ENCODING})
+_ADAPTER = HTTPAdapter(
+    pool_connections=8,
+    pool_maxsize=32,
+    max_retries=Retry(total=MAX_RETRIES, backoff_factor=RETRY_BACKOFF, status_forcelist=list(RETRY_STATUSES))
+)
+_SESSION.mount('https://', _ADAPTER)
+_SESSION.mount('http://', _ADAPTER)
+
+def fetch_feed_bytes(url: str) -> Optional[bytes]:
+    """Descarga el XML de un feed RSS/Atom con la sesión compartida."""
+    try:
+        response = _SESSION.get(url, timeout=FEED_TIMEOUT)
+        response.raise_for_status()
+        return response.content
+    except requests.exceptions.RequestException as e:
+        logger.error("[ERROR] Fallo al descargar el feed %s: %s", url, e)
+        return None
+
+def close_session():
+    """Cierra la sesión HTTP compartida. Llamar al final del pipeline."""
+    _SESSION.close()
+
+def build_async_session() -> aiohttp.ClientSession:
+    """Crea la sesión aiohttp compartida para descargar artículos en paralelo."""
+    connector = aiohttp.TCPConnector(limit=16, limit_per_host=4)
+    return aiohttp.ClientSession(
+        connector=connector,
+        # Sin timeout 'total': en aiohttp ese reloj también corre mientras la petición
+        # espera una conexión libre del pool (limit_per_host), y con todo un feed lanzado
+        # a la vez fallarían artículos que ni se han enviado. Como el timeout de requests,
+        # se acota la conexión y cada lectura del socket.
+        timeout=aiohttp.ClientTimeout(total=None, sock_connect=REQUEST_TIMEOUT, sock_read=REQUEST_TIMEOUT),
+        headers={'User-Agent': USER_AGENT, 'Accept-Encoding': ACCEPT_ENCODING}
+    )
+
+def _retry_delay(response: aiohttp.ClientResponse, attempt: int) -> float:
+    """Espera antes del siguiente intento: Retry-After si el servidor lo indica, si no backoff exponencial."""
+    retry_after = response.headers.get('Retry-After', '')
+    if retry_after.isdigit():
+        return min(float(retry_after), REQUEST_TIMEOUT)
+    return RETRY_BACKOFF * 2 ** attempt
+
+async def afetch(session: aiohttp.ClientSession, url: str) -> bytes:
+    """Descarga el HTML de una URL de forma asíncrona (reintenta 429/502/503/504)."""
+    for attempt in range(MAX_RETRIES + 1):
+        async with session.get(url) as response:
+            if response.status in RETRY_STATUSES and attempt < MAX_RETRIES:
+                delay = _retry_delay(response, attempt)
+            else:
+                response.raise_for_status() # Lanza error para códigos 4xx/5xx
+
+                # Leer el cuerpo por fragmentos hasta MAX_HTML_BYTES
+                chunks = []
+                size = 0
+                async for chunk in response.content.iter_chunked(HTML_CHUNK_BYTES):
+                    chunks.append(chunk)
+                    size += len(chunk)
+                    if size >= MAX_HTML_BYTES:
+                        break
+                return b"".join(chunks)[:MAX_HTML_BYTES]
+
+        logger.info("[REINTENTO] %s devolvió %d. Reintento %d/%d en %.1f s.", url, response.status, attempt + 1, MAX_RETRIES, delay)
+        await asyncio.sleep(delay)
 
 class NewsArticle:
     """Clase para estandarizar los datos extraídos de un artículo."""
@@ -19,14 +115,25 @@ class NewsArticle:
 
 class NewsAgent:
     
-    def __init__(self, rss_url: str, source_name: str):
+    def __init__(self, rss_url: str, source_name: str, max_age_hours: int = 48):
         self.rss_url = rss_url
         self.source_name = source_name
+        # Las entradas más antiguas se descartan antes de descargar el artículo
+        self.max_age_hours = max_age_hours
 
-    def fetch_rss_links(self) -> List[Dict]:
-        """Extrae titulares, URLs y fechas de un feed RSS/Atom."""
-        print(f"-> Buscando nuevos artículos en {self.source_name}...")
-        feed = feedparser.parse(self.rss_url)
+    def fetch_rss_links(self, feed_content: Optional[bytes] = None) -> List[Dict]:
+        """Extrae titulares, URLs y fechas de un feed RSS/Atom.
+
+        Si no se pasa el contenido ya descargado (feed_content), se descarga con
+        la sesión HTTP compartida para reutilizar las conexiones.
+        """
+        logger.info("-> Buscando nuevos artículos en %s...", self.source_name)
+        if feed_content is None:
+            feed_content = fetch_feed_bytes(self.rss_url)
+            if feed_content is None:
+                return []
+        feed = feedparser.parse(feed_content)
+        cutoff = datetime.now(pytz.utc) - timedelta(hours=self.max_age_hours)
         
         articles = []
         for entry in feed.entries:
@@ -40,41 +147,94 @@ class NewsAgent:
             except Exception:
                 dt = pytz.utc.localize(datetime.now())
 
+            if dt < cutoff:
+                continue
+
             articles.append({
                 'title': entry.title,
                 'url': entry.link,
                 'published_at': dt,
                 'source': self.source_name
             })
-        print(f"-> Encontrados {len(articles)} enlaces.")
+        logger.info("-> Encontrados %d enlaces (de %d entradas del feed).", len(articles), len(feed.entries))
         return articles
 
+    async def afetch_rss_links(self, feed_content: Optional[bytes] = None) -> List[Dict]:
+        """Versión asíncrona de fetch_rss_links (descarga y parseo en un hilo)."""
+        return await asyncio.to_thread(self.fetch_rss_links, feed_content)
+
+    def _extract_text_from_html(self, html, url: Optional[str] = None) -> Optional[str]:
+        """Parsea el HTML (bytes o str) y devuelve el texto limpio del artículo."""
+        # 1. Extractor genérico de noticias (trafilatura), válido para la mayoría de fuentes
+        extracted = trafilatura.extract(html, url=url, favor_precision=True, include_comments=False, no_fallback=False)
+        if extracted and len(extracted) >= MIN_EXTRACTED_CHARS:
+            return extracted
+
+        # 2. Alternativa: selector CSS de la fuente con Lexbor
+        tree = LexborHTMLParser(html)
+
+        # **ESTRATEGIA DE LIMPIEZA:**
+        # Esto es la parte más dependiente de la web. Cada fuente conocida tiene
+        # su selector en SOURCE_SELECTORS; para el resto se usa el <body> completo.
+        selector = SOURCE_SELECTORS.get(self.source_name)
+        main_content = tree.css_first(selector) if selector else None
+        if main_content is None:
+            main_content = tree.css_first('body') or tree.root
+
+        # Extraer todos los párrafos (p) y titulares del contenedor principal
+        selected = None
+        if main_content is not None:
+            content_tags = main_content.css('p, h1, h2')
+            selected = "\n".join([tag.text(separator=' ', strip=True) for tag in content_tags])
+
+        # Un texto corto de trafilatura sigue siendo válido: se devuelve el más largo de los dos
+        return max(extracted or "", selected or "", key=len) or None
+
+    def _clean_article_text(self, html, url: str) -> Optional[str]:
+        """Extrae el texto y descarta las páginas cuyo contenido es demasiado corto."""
+        # Se pasan los bytes directamente: Lexbor detecta la codificación
+        text_content = self._extract_text_from_html(html, url)
+
+        # Limpieza básica: Asegurar que el texto tiene un mínimo de longitud
+        if not text_content or len(text_content) < 200:
+             logger.warning("[ADVERTENCIA] Texto muy corto. Posible fallo en el scraping de: %s", url)
+             return None
+
+        logger.debug("[OK] Texto extraído con %d caracteres.", len(text_content))
+        return text_content
+
     def get_article_content(self, url: str) -> Optional[str]:
         """Descarga el HTML y extrae el texto limpio del cuerpo del artículo."""
         try:
-            headers = {'User-Agent': USER_AGENT}
-            response = requests.get(url, headers=headers, timeout=15)
-            response.raise_for_status() # Lanza error para códigos 4xx/5xx
-            
-            soup = BeautifulSoup(response.content, 'lxml')
-            
-            # **ESTRATEGIA DE LIMPIEZA:**
-            # Esto es la parte más dependiente de la web. Aquí asumimos que
-            # el contenido principal está dentro de ciertas etiquetas comunes
-            # de artículos (ej. <article>, <div> con clase 'body-content').
-            
-            # Implementación genérica: Extraer todos los párrafos (p) y textos
-            content_tags = soup.find_all(['p', 'h1', 'h2'])
-            text_content = "\n".join([tag.get_text(separator=' ', strip=True) for tag in content_tags])
-            
-            # Limpieza básica: Asegurar que el texto tiene un mínimo de longitud
-            if len(text_content) < 200:
-                 print(f"   [ADVERTENCIA] Texto muy corto. Posible fallo en el scraping de: {url}")
-                 return None
+            with _SESSION.get(url, timeout=REQUEST_TIMEOUT, stream=True) as response:
+                response.raise_for_status() # Lanza error para códigos 4xx/5xx
 
-            print(f"   [OK] Texto extraído con {len(text_content)} caracteres.")
-            return text_content
+                # iter_content envuelve los errores de urllib3 a mitad del cuerpo
+                # (timeouts, conexión cortada, descompresión) en RequestException
+                chunks = []
+                size = 0
+                for chunk in response.iter_content(HTML_CHUNK_BYTES):
+                    chunks.append(chunk)
+                    size += len(chunk)
+                    if size >= MAX_HTML_BYTES:
+                        break
+                html = b"".join(chunks)[:MAX_HTML_BYTES]
+            
+            return self._clean_article_text(html, url)
             
         except requests.exceptions.RequestException as e:
-            print(f"   [ERROR] Fallo al descargar {url}: {e}")
-            return None
\ No newline at end of file
+            logger.error("[ERROR] Fallo al descargar %s: %s", url, e)
+            return None
+
+    async def aget_article_content(self, session: aiohttp.ClientSession, url: str) -> Optional[str]:
+        """Versión asíncrona de get_article_content usando una sesión aiohttp compartida."""
+        try:
+            html = await afetch(session, url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # %r: str(asyncio.TimeoutError()) está vacío y el log no diría el motivo
+            logger.error("[ERROR] Fallo al descargar %s: %r", url, e)
+            return None
+
+        # El parseo (trafilatura/Lexbor) es CPU: en un hilo para no bloquear el bucle
+        # de eventos mientras el resto de descargas siguen en curso con su timeout
+        return await asyncio.to_thread(self._clean_article_text, html, url)
\ No newline at end of file
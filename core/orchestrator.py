@@ -1,71 +1,182 @@
 import os
+import queue
+import asyncio
+import logging
+import functools
+from logging.handlers import QueueHandler, QueueListener
+import xxhash
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Tuple
 from dotenv import load_dotenv
 
 # Importar los módulos que acabamos de crear
-from agents.scrapers.news_agent import NewsAgent 
-from core.supabase_handler import SupabaseHandler 
+from agents.scrapers.news_agent import NewsAgent, build_async_session, close_session
+from core.supabase_handler import SupabaseHandler, get_handler
 
 # Cargar las variables de entorno al inicio del script
 load_dotenv()
 
-# Configuración de prueba desde .env
+logger = logging.getLogger(__name__)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING").strip().upper() # INFO/DEBUG para ver el detalle por artículo
+
+# Configuración de prueba desde .env (una o varias fuentes separadas por comas)
 TEST_RSS_URL = os.getenv("NEWS_SOURCE_URL")
 TEST_SOURCE_NAME = "FinancialNewsTest" # Nombre de la fuente para la DB
+FEEDS_LIST = [u.strip() for u in (TEST_RSS_URL or "").split(",") if u.strip()]
+NAMES_LIST = [n.strip() for n in os.getenv("NEWS_SOURCE_NAMES", "").split(",") if n.strip()]
+MAX_SOURCE_WORKERS = 8
+INSERT_BATCH_SIZE = 25 # Metadatos acumulados antes de cada inserción en bloque
+UPLOAD_CONCURRENCY = 8 # Subidas simultáneas al Storage por fuente
+URL_HASH_ALGORITHM = "xxh3_128" # Se guarda junto al hash para poder migrar de algoritmo
 
-def run_data_collection():
-    """Ejecuta el pipeline de recolección de datos: Scraping -> Storage -> DB."""
-    
-    if not TEST_RSS_URL:
-        print("ERROR: La variable NEWS_SOURCE_URL no está configurada en el .env. Deteniendo el proceso.")
-        return
+@functools.lru_cache(maxsize=4096)
+def compute_url_hash(url: str) -> str:
+    """Hash de la URL para deduplicar y nombrar el archivo (no necesita ser criptográfico)."""
+    return xxhash.xxh3_128_hexdigest(url.encode())
+
+async def get_new_links(news_agent: NewsAgent, supabase_handler: SupabaseHandler) -> List[Dict]:
+    """Obtiene los enlaces del RSS y descarta los ya almacenados en la DB."""
+    article_links = await news_agent.afetch_rss_links()
+
+    # Descartar antes de descargar los artículos cuyo hash de URL ya está en la DB
+    hashes = [compute_url_hash(link['url']) for link in article_links]
+    existing = await asyncio.to_thread(supabase_handler.get_existing_url_hashes, hashes)
 
-    # Inicializar Agentes
-    supabase_handler = SupabaseHandler()
-    news_agent = NewsAgent(rss_url=TEST_RSS_URL, source_name=TEST_SOURCE_NAME)
+    # También se descartan los enlaces repetidos dentro del mismo feed: dos filas con
+    # la misma URL en un upsert hacen que PostgreSQL rechace el lote completo
+    new_links = []
+    seen = set(existing)
+    for link, url_hash in zip(article_links, hashes):
+        if url_hash not in seen:
+            seen.add(url_hash)
+            link['url_hash'] = url_hash
+            new_links.append(link)
+    logger.info("-> %d artículos ya almacenados. Nuevos: %d.", len(article_links) - len(new_links), len(new_links))
+    return new_links
 
-    # 1. Obtener lista de URLs del RSS
-    article_links = news_agent.fetch_rss_links()
+async def process_source(news_agent: NewsAgent, supabase_handler: SupabaseHandler) -> Tuple[int, int]:
+    """Pipeline asíncrono completo de una fuente: RSS -> descarga -> Storage -> DB.
 
+    Cada artículo avanza por su cuenta: en cuanto termina su descarga y parseo se
+    sube al Storage (acotado por un semáforo) mientras los demás siguen
+    descargándose, y cada lote de metadatos se inserta como tarea en paralelo a
+    las subidas de los artículos siguientes.
+    """
+    # 1. Obtener las URLs nuevas del RSS
+    new_links = await get_new_links(news_agent, supabase_handler)
+
+    upload_semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
     total_processed = 0
-    total_inserted = 0
-    
-    # 2. Iterar sobre los enlaces y procesar cada artículo
-    for link_data in article_links:
-        
-        print(f"\n Procesando: {link_data['title'][:50]}...")
-        
+    pending = []
+    insert_tasks = []
+
+    async def process_article(session, link_data: Dict):
+        nonlocal total_processed, pending
+
+        logger.debug("Procesando: %s...", link_data['title'][:50])
+
         # 2a. Descargar y limpiar el contenido
-        text_content = news_agent.get_article_content(link_data['url'])
-        
+        text_content = await news_agent.aget_article_content(session, link_data['url'])
         if text_content is None:
-            continue
-        
+            return
+
         total_processed += 1
-        
-        # 2b. Intentar insertar los metadatos (la inserción genera un UUID)
-        # Usamos 'try-except' para generar un UUID solo si la inserción es exitosa.
-        
-        # La URL ya es un identificador único, la usamos como ID temporal para el storage
+
+        # 2b. La URL ya es un identificador único, la usamos como ID temporal para el storage
         # NOTA: Supabase genera el UUID real en la DB. Usamos un hash o la URL como nombre de archivo
         # Para esta implementación, usaremos el URL hash para el nombre del archivo de texto.
-        temp_article_id = hashlib.sha256(link_data['url'].encode()).hexdigest()
+        temp_article_id = link_data['url_hash']
 
         # 2c. Subir el texto completo al Storage
-        storage_path = supabase_handler.upload_article_text(temp_article_id, text_content)
+        async with upload_semaphore:
+            storage_path = await supabase_handler.aupload_article_text(temp_article_id, text_content)
 
         if storage_path:
-            # 2d. Insertar metadatos en PostgreSQL
-            metadata = {
+            # 2d. Acumular los metadatos para insertarlos en PostgreSQL por lotes
+            pending.append({
                 'title': link_data['title'],
                 'url': link_data['url'],
                 'source': link_data['source'],
                 'published_at': link_data['published_at'].isoformat(),
-            }
-            
-            uuid = supabase_handler.insert_article_metadata(metadata, storage_path)
-            
-            if uuid:
-                 total_inserted += 1
+                'url_hash': link_data['url_hash'],
+                'hash_algorithm': URL_HASH_ALGORITHM,
+                'storage_path': storage_path,
+            })
+
+            if len(pending) >= INSERT_BATCH_SIZE:
+                insert_tasks.append(asyncio.create_task(supabase_handler.ainsert_articles_metadata_bulk(pending)))
+                pending = []
+
+    # 2. Procesar todos los artículos de forma concurrente
+    async with build_async_session() as session:
+        results = await asyncio.gather(*(process_article(session, link) for link in new_links), return_exceptions=True)
+
+    for link_data, result in zip(new_links, results):
+        if isinstance(result, BaseException):
+            logger.error("[ERROR] Fallo inesperado en %s: %s", link_data['url'], result)
+
+    # 3. Insertar los metadatos que queden pendientes y esperar a todos los lotes
+    insert_tasks.append(asyncio.create_task(supabase_handler.ainsert_articles_metadata_bulk(pending)))
+    inserted_batches = await asyncio.gather(*insert_tasks)
+
+    return total_processed, sum(len(uuids) for uuids in inserted_batches)
+
+def run_data_collection(news_agent: NewsAgent, supabase_handler: SupabaseHandler) -> Tuple[int, int]:
+    """Ejecuta el pipeline de recolección de una fuente: Scraping -> Storage -> DB.
+
+    Devuelve la tupla (artículos procesados, artículos insertados).
+    """
+    return asyncio.run(process_source(news_agent, supabase_handler))
+
+def setup_logging() -> QueueListener:
+    """Configura el logging raíz: los hilos encolan y un listener escribe en segundo plano."""
+    log_queue = queue.Queue(-1)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    root_logger = logging.getLogger()
+    root_logger.addHandler(QueueHandler(log_queue))
+
+    # Un nivel desconocido no debe impedir la ejecución: se usa WARNING
+    level = logging.getLevelName(LOG_LEVEL)
+    root_logger.setLevel(level if isinstance(level, int) else logging.WARNING)
+
+    listener = QueueListener(log_queue, stream_handler)
+    listener.start()
+    return listener
+
+def run_all_sources():
+    """Lanza la recolección de todas las fuentes en paralelo (un hilo por fuente)."""
+
+    if not FEEDS_LIST:
+        logger.error("ERROR: La variable NEWS_SOURCE_URL no está configurada en el .env. Deteniendo el proceso.")
+        return
+
+    # Si faltan nombres, se usa el nombre de prueba para el resto de fuentes
+    names_list = NAMES_LIST + [TEST_SOURCE_NAME] * (len(FEEDS_LIST) - len(NAMES_LIST))
+
+    # Inicializar Agentes (el handler de Supabase se comparte entre hilos)
+    supabase_handler = get_handler()
+
+    total_processed = 0
+    total_inserted = 0
+
+    # Las fuentes apuntan a servidores distintos: el tiempo total es el de la más lenta
+    with ThreadPoolExecutor(max_workers=min(MAX_SOURCE_WORKERS, len(FEEDS_LIST))) as executor:
+        futures = {
+            executor.submit(run_data_collection, NewsAgent(rss_url=url, source_name=name), supabase_handler): name
+            for url, name in zip(FEEDS_LIST, names_list)
+        }
+        for future in as_completed(futures):
+            try:
+                processed, inserted = future.result()
+            except Exception:
+                logger.exception("ERROR: Fallo en la recolección de %s", futures[future])
+                continue
+            total_processed += processed
+            total_inserted += inserted
+
+    close_session()
 
     print("\n--- RESUMEN ---")
     print(f"Artículos procesados: {total_processed}")
@@ -73,6 +184,8 @@ def run_data_collection():
     print("-----------------")
 
 if __name__ == "__main__":
-    # Necesitas importar 'hashlib' en el archivo real si usas el hash de URL
-    import hashlib
-    run_data_collection()
\ No newline at end of file
+    log_listener = setup_logging()
+    try:
+        run_all_sources()
+    finally:
+        log_listener.stop()
\ No newline at end of file
@@ -1,12 +1,18 @@
 import os
+import asyncio
+import logging
+from functools import lru_cache
 from supabase import create_client, Client
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Set
+
+logger = logging.getLogger(__name__)
 
 # Cargar configuración desde .env
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 STORAGE_BUCKET = os.getenv("SUPABASE_STORAGE_BUCKET", "article_texts")
 TABLE_NAME = "news_articles"
+HASH_QUERY_CHUNK = 100 # Hashes por consulta (limita la longitud de la URL de PostgREST)
 
 class SupabaseHandler:
     
@@ -14,8 +20,10 @@ class SupabaseHandler:
         """Inicializa el cliente de Supabase."""
         if not SUPABASE_URL or not SUPABASE_KEY:
              raise ValueError("Las claves de Supabase no están configuradas en .env")
+        # El cliente (httpx.Client por debajo, seguro entre hilos) se comparte entre
+        # los hilos del orquestador sin necesidad de bloqueos
         self.supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        print("-> Conexión a Supabase establecida.")
+        logger.info("-> Conexión a Supabase establecida.")
 
     def upload_article_text(self, article_id: str, text_content: str) -> Optional[str]:
         """Sube el texto completo del artículo al Supabase Storage."""
@@ -25,15 +33,35 @@ class SupabaseHandler:
             self.supabase.storage.from_(STORAGE_BUCKET).upload(
                 file=text_content.encode('utf-8'),
                 path=file_path,
-                file_options={"content-type": "text/plain"}
+                # upsert: si un intento anterior subió el texto pero no llegó a insertar
+                # los metadatos, la nueva ejecución sobrescribe el archivo y se recupera
+                file_options={"content-type": "text/plain", "upsert": "true"}
             )
-            print(f"   [STORAGE OK] Texto subido a: {file_path}")
+            logger.debug("[STORAGE OK] Texto subido a: %s", file_path)
             return file_path
         except Exception as e:
-            # Manejar el caso de que el archivo ya exista (es poco probable con UUIDs)
-            print(f"   [STORAGE ERROR] Fallo al subir el texto: {e}")
+            logger.error("[STORAGE ERROR] Fallo al subir el texto: %s", e)
             return None
 
+    async def aupload_article_text(self, article_id: str, text_content: str) -> Optional[str]:
+        """Versión asíncrona de upload_article_text (la petición se ejecuta en un hilo)."""
+        return await asyncio.to_thread(self.upload_article_text, article_id, text_content)
+
+    def get_existing_url_hashes(self, hashes: List[str]) -> Set[str]:
+        """Devuelve el subconjunto de hashes de URL que ya están almacenados en la tabla."""
+        existing = set()
+
+        try:
+            for start in range(0, len(hashes), HASH_QUERY_CHUNK):
+                chunk = hashes[start:start + HASH_QUERY_CHUNK]
+                response = self.supabase.table(TABLE_NAME).select('url_hash').in_('url_hash', chunk).execute()
+                existing.update(row['url_hash'] for row in (response.data or []))
+        except Exception as e:
+            # Sin deduplicación se procesan todos los artículos; el upsert por URL evita duplicados
+            logger.error("[DB ERROR] Fallo al consultar los artículos existentes: %s", e)
+
+        return existing
+
     def insert_article_metadata(self, metadata: Dict[str, Any], storage_path: str) -> Optional[str]:
         """Inserta los metadatos del artículo en la tabla PostgreSQL."""
         metadata['storage_path'] = storage_path
@@ -44,15 +72,43 @@ class SupabaseHandler:
             # Supabase devuelve el registro insertado
             if response.data:
                 article_uuid = response.data[0]['id']
-                print(f"   [DB OK] Metadatos insertados. UUID: {article_uuid}")
+                logger.debug("[DB OK] Metadatos insertados. UUID: %s", article_uuid)
                 return article_uuid
             
         except Exception as e:
             # La excepción más común aquí es la violación de la restricción UNIQUE (URL duplicada)
             error_msg = str(e)
             if "duplicate key value violates unique constraint" in error_msg:
-                print("   [DB SKIP] Artículo ya existe (URL duplicada). Saltando.")
+                logger.info("[DB SKIP] Artículo ya existe (URL duplicada). Saltando.")
                 return None
             else:
-                print(f"   [DB ERROR] Fallo al insertar metadatos: {error_msg}")
-                return None
\ No newline at end of file
+                logger.error("[DB ERROR] Fallo al insertar metadatos: %s", error_msg)
+                return None
+
+    def insert_articles_metadata_bulk(self, rows: List[Dict[str, Any]]) -> List[str]:
+        """Inserta (o actualiza por URL) un lote de metadatos en una sola petición."""
+        if not rows:
+            return []
+
+        try:
+            response = self.supabase.table(TABLE_NAME).upsert(rows, on_conflict='url').execute()
+
+            # Supabase devuelve los registros insertados/actualizados
+            article_uuids = [row['id'] for row in (response.data or [])]
+            logger.info("[DB OK] Lote de %d metadatos insertado.", len(article_uuids))
+            return article_uuids
+
+        except Exception as e:
+            # Un fallo del lote no debe perder los 25 artículos: se reintenta fila a fila
+            logger.error("[DB ERROR] Fallo al insertar el lote de metadatos, se reintenta por artículo: %s", e)
+            article_uuids = [self.insert_article_metadata(row, row['storage_path']) for row in rows]
+            return [article_uuid for article_uuid in article_uuids if article_uuid]
+
+    async def ainsert_articles_metadata_bulk(self, rows: List[Dict[str, Any]]) -> List[str]:
+        """Versión asíncrona de insert_articles_metadata_bulk (la petición se ejecuta en un hilo)."""
+        return await asyncio.to_thread(self.insert_articles_metadata_bulk, rows)
+
+@lru_cache(maxsize=1)
+def get_handler() -> SupabaseHandler:
+    """Devuelve el SupabaseHandler compartido del proceso (se crea una sola vez)."""
+    return SupabaseHandler()
\ No newline at end of file
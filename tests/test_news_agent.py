@@ -0,0 +1,86 @@
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from agents.scrapers import news_agent
+from agents.scrapers.news_agent import afetch, build_async_session
+
+
+async def _serve(handler):
+    """Levanta un servidor aiohttp local con la ruta /{name} y devuelve (runner, base_url)."""
+    app = web.Application()
+    app.router.add_get('/{name}', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def test_afetch_timeout_excludes_wait_for_pooled_connection(monkeypatch):
+    # 12 artículos del mismo host con limit_per_host=4: tres tandas de 0.4 s (1.2 s en total).
+    # Cada petición tarda menos que el timeout, así que ninguna debe fallar por esperar turno.
+    monkeypatch.setattr(news_agent, 'REQUEST_TIMEOUT', 1)
+
+    async def slow(request):
+        await asyncio.sleep(0.4)
+        return web.Response(body=request.match_info['name'].encode())
+
+    async def run():
+        runner, base_url = await _serve(slow)
+        try:
+            async with build_async_session() as session:
+                urls = [f"{base_url}/{i}" for i in range(12)]
+                return await asyncio.gather(*(afetch(session, url) for url in urls), return_exceptions=True)
+        finally:
+            await runner.cleanup()
+
+    results = asyncio.run(run())
+    assert results == [str(i).encode() for i in range(12)]
+
+
+def _flaky_handler(failures, status=503):
+    """Handler que responde `status` las primeras `failures` veces por ruta y después 200."""
+    calls = {}
+
+    async def handler(request):
+        name = request.match_info['name']
+        calls[name] = calls.get(name, 0) + 1
+        if calls[name] <= failures:
+            return web.Response(status=status)
+        return web.Response(body=name.encode())
+
+    return handler, calls
+
+
+def _fetch_with_server(handler, path):
+    async def run():
+        runner, base_url = await _serve(handler)
+        try:
+            async with build_async_session() as session:
+                return await afetch(session, f"{base_url}/{path}")
+        finally:
+            await runner.cleanup()
+
+    return asyncio.run(run())
+
+
+def test_afetch_retries_transient_statuses(monkeypatch):
+    monkeypatch.setattr(news_agent, 'RETRY_BACKOFF', 0)
+    handler, calls = _flaky_handler(failures=2, status=503)
+
+    assert _fetch_with_server(handler, 'articulo') == b'articulo'
+    assert calls['articulo'] == 3
+
+
+def test_afetch_gives_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr(news_agent, 'RETRY_BACKOFF', 0)
+    handler, calls = _flaky_handler(failures=10, status=429)
+
+    with pytest.raises(aiohttp.ClientResponseError) as excinfo:
+        _fetch_with_server(handler, 'articulo')
+    assert excinfo.value.status == 429
+    assert calls['articulo'] == news_agent.MAX_RETRIES + 1